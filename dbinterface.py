@@ -15,7 +15,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-"""Provide the DBInterface class."""
+"""Provide the DBInterface class and the read_dataset function."""
 
 __author__ = "Félix Chénier"
 __copyright__ = "Copyright (C) 2020 Félix Chénier"
@@ -23,16 +23,928 @@ __email__ = "chenier.felix@uqam.ca"
 __license__ = "Apache 2.0"
 
 
-import kineticstoolkit as ktk
-import limitedinteraction as li
-
 import requests
 import os
+import sys
+import importlib
+import subprocess
+import urllib.parse
 from io import StringIO
 import pandas as pd
+import numpy as np
 import warnings
-from typing import Dict, List, Any, Union
+from typing import Dict, List, Any, Union, Optional, Tuple
 import json
+import hashlib
+import zipfile
+import struct
+import io
+import sqlite3
+import time
+import shutil
+import tempfile
+from contextlib import closing, contextmanager
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class _LazyModule:
+    """
+    Proxy that imports a module on first attribute access.
+
+    kineticstoolkit and limitedinteraction import GUI and plotting stacks,
+    which are only needed for dialogs and ktk.zip files. Importing them
+    lazily keeps `import dbinterface` fast for scripts and cluster jobs.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attribute: str) -> Any:
+        if attribute.startswith("__"):
+            # Introspection, e.g. by doctest or copy, must not import.
+            raise AttributeError(attribute)
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attribute)
+
+
+def _measure_import_time() -> float:
+    """
+    Measure the time to import this module in a fresh interpreter.
+
+    This guards against import time regressions: importing dbinterface
+    must not load kineticstoolkit, limitedinteraction or their GUI and
+    plotting stacks. It is checked by running this module's doctests.
+
+    >>> _measure_import_time() < 5.0
+    True
+
+    """
+    code = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        "import dbinterface\n"
+        "duration = time.perf_counter() - start\n"
+        "heavy = [name for name in ('kineticstoolkit', 'limitedinteraction',"
+        " 'matplotlib') if name in sys.modules]\n"
+        "print(' '.join(heavy) if heavy else duration)\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.strip()
+    try:
+        return float(output)
+    except ValueError:
+        raise ValueError(f"Importing dbinterface also imported {output}.")
+
+
+ktk = _LazyModule("kineticstoolkit")
+li = _LazyModule("limitedinteraction")
+pa = _LazyModule("pyarrow")
+pq = _LazyModule("pyarrow.parquet")
+ds = _LazyModule("pyarrow.dataset")
+
+
+@contextmanager
+def _file_lock(filename: str):
+    """
+    Hold an exclusive lock on a file, across processes.
+
+    The lock is taken on a companion `filename.lock` file, so that the
+    locked file itself can be replaced while the lock is held. The lock
+    file is removed on release, so that no lock file is left next to the
+    locked file.
+    """
+    lock_file = filename + ".lock"
+    while True:
+        fid = open(lock_file, "a+b")
+        if fcntl is None:
+            fid.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(fid.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    pass  # LK_LOCK gives up after 10 seconds, try again
+            break  # An open lock file can't be removed on Windows
+
+        fcntl.flock(fid.fileno(), fcntl.LOCK_EX)
+        try:
+            if os.path.samestat(os.fstat(fid.fileno()), os.stat(lock_file)):
+                break
+        except FileNotFoundError:
+            pass
+        # Removed by its former holder while we waited: lock the new one
+        fid.close()
+
+    try:
+        yield
+    finally:
+        if fcntl is not None:
+            # Remove before unlocking, so that waiters see it's obsolete
+            os.remove(lock_file)
+            fcntl.flock(fid.fileno(), fcntl.LOCK_UN)
+            fid.close()
+        else:
+            fid.seek(0)
+            msvcrt.locking(fid.fileno(), msvcrt.LK_UNLCK, 1)
+            fid.close()
+            try:
+                os.remove(lock_file)
+            except PermissionError:
+                pass  # Opened by a waiter, which will remove it
+
+
+def _make_temp_file(filename: str) -> str:
+    """Create a uniquely named temporary file next to a file."""
+    fd, temp_file = tempfile.mkstemp(
+        suffix=".tmp",
+        prefix=os.path.basename(filename) + ".",
+        dir=os.path.dirname(os.path.abspath(filename)),
+    )
+    os.close(fd)
+    return temp_file
+
+
+def _write_json_atomically(filename: str, content: Any, **kwargs) -> None:
+    """Write a json file atomically, so that readers never see half."""
+    temp_file = _make_temp_file(filename)
+    try:
+        with open(temp_file, "w") as fid:
+            json.dump(content, fid, **kwargs)
+        os.replace(temp_file, filename)
+    except BaseException:
+        os.remove(temp_file)
+        raise
+
+
+_PACK_EXTENSION = ".dbpack"
+
+
+def _split_packed_file_name(filename: str) -> Tuple[str, str]:
+    """
+    Split a file name into a pack file name and a member name.
+
+    Files stored in a pack are referenced as `path/to/xxx.dbpack/member`.
+    For files that are not in a pack, the member name is ''.
+    """
+    index = filename.find(_PACK_EXTENSION + "/")
+    if index == -1:
+        return (filename, "")
+    index += len(_PACK_EXTENSION)
+    return (filename[:index], filename[index + 1 :])
+
+
+def _read_pack_infos(
+    pack_file: str, packs: Optional[Dict[str, Any]] = None
+) -> Tuple[os.stat_result, Dict[str, zipfile.ZipInfo]]:
+    """
+    Return the stat of a pack and the ZipInfo of each of its members.
+
+    If `packs` is given, it is used as a cache so that each pack is opened
+    only once, for example during a scan.
+    """
+    if packs is not None and pack_file in packs:
+        return packs[pack_file]
+    stat = os.stat(pack_file)
+    with _open_pack(pack_file) as pack:
+        infos = {info.filename: info for info in pack.infolist()}
+    if packs is not None:
+        packs[pack_file] = (stat, infos)
+    return (stat, infos)
+
+
+def _stat_file(
+    filename: str, packs: Optional[Dict[str, Any]] = None
+) -> Tuple[int, int]:
+    """Return the size and modification time (ns) of a file."""
+    pack_file, member = _split_packed_file_name(filename)
+    if member == "":
+        stat = os.stat(pack_file)
+        return (stat.st_size, stat.st_mtime_ns)
+    stat, infos = _read_pack_infos(pack_file, packs)
+    try:
+        return (infos[member].file_size, stat.st_mtime_ns)
+    except KeyError:
+        raise FileNotFoundError(filename)
+
+
+def _find_pack_end(pack_file: str) -> int:
+    """
+    Return the size of the last complete archive at the start of a pack.
+
+    Since members are appended to packs in place, a pack may end with a
+    member that is being written, or that a crashed writer left. The end of
+    central directory records are then searched backwards, until one ends a
+    valid archive.
+    """
+    size = os.path.getsize(pack_file)
+    position = size
+    while position > 0:
+        start = max(0, position - (1 << 16))
+        with open(pack_file, "rb") as fid:
+            fid.seek(start)
+            # Overlap the next chunk, for records that span both chunks
+            chunk = fid.read(position - start + 21)
+            index = len(chunk)
+            while True:
+                index = chunk.rfind(b"PK\x05\x06", 0, index)
+                if index == -1:
+                    break
+                fid.seek(start + index + 20)
+                (comment_length,) = struct.unpack("<H", fid.read(2))
+                end = start + index + 22 + comment_length
+                if end > size:
+                    continue
+                try:
+                    with _FileRange(pack_file, 0, end) as archive:
+                        zipfile.ZipFile(archive).close()
+                    return end
+                except (zipfile.BadZipFile, OSError, ValueError):
+                    pass  # Not an end record, only looks like one
+        position = start
+    raise zipfile.BadZipFile(f"{pack_file} contains no complete archive.")
+
+
+def _open_pack(pack_file: str) -> zipfile.ZipFile:
+    """Open a pack for reading, ignoring any incomplete appended member."""
+    try:
+        return zipfile.ZipFile(pack_file, "r")
+    except zipfile.BadZipFile:
+        return zipfile.ZipFile(
+            _FileRange(pack_file, 0, _find_pack_end(pack_file)), "r"
+        )
+
+
+def _write_pack_members(
+    pack_file: str, members: Dict[int, Tuple[str, str]]
+) -> None:
+    """
+    Write files into a pack, replacing any member with the same dbfid.
+
+    `members` maps each dbfid to a tuple (member name, source file). The
+    files are appended after the end of the pack, followed by a new central
+    directory that omits the replaced members. The former archive is kept
+    intact until then, so that readers and crashes never see a corrupted
+    pack (see `_open_pack`), and saving a file costs only its own size. The
+    space of replaced members and former central directories is reclaimed
+    by rewriting the pack, in a temporary file that then replaces it, once
+    it exceeds the space of the current members. This is done under a lock
+    on the pack.
+    """
+    prefixes = tuple(f"dbfid{dbfid}n" for dbfid in members)
+
+    with _file_lock(pack_file):
+        if not os.path.exists(pack_file):
+            _rewrite_pack(pack_file, members, prefixes)
+            return
+
+        end = _find_pack_end(pack_file)
+        with _open_pack(pack_file) as pack:
+            used_size = sum(
+                info.compress_size
+                for info in pack.infolist()
+                if not info.filename.startswith(prefixes)
+            ) + sum(
+                os.path.getsize(source_file)
+                for _, source_file in members.values()
+            )
+        if end > 2 * used_size + (1 << 20):
+            _rewrite_pack(pack_file, members, prefixes)
+            return
+
+        with open(pack_file, "r+b") as fid:
+            fid.truncate(end)  # Drop what a crashed writer left
+            with zipfile.ZipFile(fid, "a", zipfile.ZIP_STORED) as pack:
+                # Write after the former archive instead of over its
+                # central directory.
+                pack.start_dir = end
+                for info in list(pack.filelist):
+                    if info.filename.startswith(prefixes):
+                        pack.filelist.remove(info)
+                        pack.NameToInfo.pop(info.filename, None)
+                for member, source_file in members.values():
+                    pack.write(source_file, member)
+
+        # Appending doesn't change the pack's folder, which the shared file
+        # index watches.
+        os.utime(os.path.dirname(os.path.abspath(pack_file)))
+
+
+def _rewrite_pack(
+    pack_file: str,
+    members: Dict[int, Tuple[str, str]],
+    prefixes: Tuple[str, ...],
+) -> None:
+    """
+    Rewrite a pack with new members, without unused space.
+
+    The pack is written in a temporary file that then replaces it. The
+    lock on the pack must be held.
+    """
+    temp_file = _make_temp_file(pack_file)
+    try:
+        with zipfile.ZipFile(temp_file, "w", zipfile.ZIP_STORED) as new:
+            if os.path.exists(pack_file):
+                with _open_pack(pack_file) as pack:
+                    for info in pack.infolist():
+                        if info.filename.startswith(prefixes):
+                            continue  # Replaced
+                        with pack.open(info) as source, new.open(
+                            info, "w", force_zip64=True
+                        ) as destination:
+                            shutil.copyfileobj(source, destination)
+            for member, source_file in members.values():
+                new.write(source_file, member)
+        os.replace(temp_file, pack_file)
+    except BaseException:
+        os.remove(temp_file)
+        raise
+
+
+def _hash_file(
+    filename: str, packs: Optional[Dict[str, Any]] = None
+) -> str:
+    """Return a fast content hash of a file."""
+    pack_file, member = _split_packed_file_name(filename)
+    if member != "":
+        # The pack already stores a checksum of each member.
+        infos = _read_pack_infos(pack_file, packs)[1]
+        return f"crc32:{infos[member].CRC:08x}"
+
+    hasher = hashlib.blake2b(digest_size=16)
+    with open(filename, "rb") as fid:
+        for chunk in iter(lambda: fid.read(1 << 20), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _write_array_member(
+    archive: zipfile.ZipFile, member: str, array: np.ndarray
+) -> None:
+    """Write an array as an uncompressed npy member of a zip archive."""
+    info = zipfile.ZipInfo(member)
+    info.compress_type = zipfile.ZIP_STORED
+    # The size is unknown beforehand and may exceed 2 GiB.
+    with archive.open(info, "w", force_zip64=True) as fid:
+        np.lib.format.write_array(
+            fid, np.ascontiguousarray(array), allow_pickle=False
+        )
+
+
+class _FileRange(io.RawIOBase):
+    """
+    Read-only file object over a range of bytes of a file.
+
+    This is used to open a ktk.zip that is stored uncompressed inside a
+    pack, without extracting it.
+    """
+
+    def __init__(self, filename: str, offset: int, size: int) -> None:
+        super().__init__()
+        self._fid = open(filename, "rb")
+        self._offset = offset
+        self._size = size
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, position: int, whence: int = 0) -> int:
+        if whence == 1:
+            position += self._position
+        elif whence == 2:
+            position += self._size
+        if position < 0:
+            raise OSError("Negative seek position.")
+        self._position = position
+        return position
+
+    def readinto(self, buffer: Any) -> int:
+        length = min(len(buffer), self._size - self._position)
+        if length <= 0:
+            return 0
+        self._fid.seek(self._offset + self._position)
+        length = self._fid.readinto(memoryview(buffer)[:length])
+        self._position += length
+        return length
+
+    def close(self) -> None:
+        self._fid.close()
+        super().close()
+
+
+def _seek_member_data(
+    fid: Any, info: zipfile.ZipInfo, offset: int = 0
+) -> int:
+    """
+    Seek to the content of an uncompressed zip member, and return its offset.
+
+    `offset` is the offset of the zip archive in the file.
+    """
+    # Skip the local file header to reach the content
+    fid.seek(offset + info.header_offset)
+    local_header = fid.read(30)
+    name_length, extra_length = struct.unpack("<HH", local_header[26:30])
+    if (
+        local_header[0:4] != b"PK\x03\x04"
+        or fid.read(name_length).decode("utf-8") != info.filename
+    ):
+        raise ValueError(f"Corrupted member {info.filename}.")
+    return fid.seek(
+        offset + info.header_offset + 30 + name_length + extra_length
+    )
+
+
+def _locate_pack_member(
+    pack_file: str, member: str
+) -> Optional[Tuple[int, int]]:
+    """
+    Return the offset and size of a member inside a pack.
+
+    None is returned if the member is compressed and therefore cannot be
+    read in place.
+    """
+    with _open_pack(pack_file) as pack:
+        info = pack.getinfo(member)
+    if info.compress_type != zipfile.ZIP_STORED:
+        return None
+    with open(pack_file, "rb") as fid:
+        return (_seek_member_data(fid, info), info.file_size)
+
+
+def _open_archive(
+    filename: str, location: Optional[Tuple[int, int]] = None
+) -> zipfile.ZipFile:
+    """Open a zip archive, which may be located inside a larger file."""
+    if location is None:
+        return zipfile.ZipFile(filename, "r")
+    return zipfile.ZipFile(_FileRange(filename, *location), "r")
+
+
+def _memmap_array_member(
+    filename: str, member: str, location: Optional[Tuple[int, int]] = None
+) -> np.ndarray:
+    """
+    Memory-map an uncompressed npy member of a zip archive.
+
+    Only the pages that are effectively indexed are read from disk. If the
+    zip archive is itself stored inside a larger file such as a pack,
+    `location` is its offset and size in this file.
+
+    >>> import tempfile
+    >>> filename = os.path.join(tempfile.mkdtemp(), "test.ktk.zip")
+    >>> array = np.arange(12.0).reshape(4, 3)
+    >>> with zipfile.ZipFile(filename, "w", zipfile.ZIP_DEFLATED) as zf:
+    ...     zf.writestr("value.json", "{}")
+    ...     _write_array_member(zf, "arrays/data0.npy", array)
+    >>> mapped = _memmap_array_member(filename, "arrays/data0.npy")
+    >>> isinstance(mapped, np.memmap), np.array_equal(mapped, array)
+    (True, True)
+
+    >>> pack_file = os.path.join(os.path.dirname(filename), "S1.dbpack")
+    >>> with zipfile.ZipFile(pack_file, "w", zipfile.ZIP_STORED) as pack:
+    ...     pack.writestr("other.txt", "other")
+    ...     pack.write(filename, "test.ktk.zip")
+    >>> location = _locate_pack_member(pack_file, "test.ktk.zip")
+    >>> mapped = _memmap_array_member(
+    ...     pack_file, "arrays/data0.npy", location
+    ... )
+    >>> isinstance(mapped, np.memmap), np.array_equal(mapped, array)
+    (True, True)
+
+    """
+    with _open_archive(filename, location) as archive:
+        info = archive.getinfo(member)
+        if info.compress_type != zipfile.ZIP_STORED:
+            with archive.open(info) as fid:
+                return np.lib.format.read_array(fid, allow_pickle=False)
+
+    with open(filename, "rb") as fid:
+        _seek_member_data(fid, info, 0 if location is None else location[0])
+        version = np.lib.format.read_magic(fid)
+        if version == (1, 0):
+            shape, fortran_order, dtype = (
+                np.lib.format.read_array_header_1_0(fid)
+            )
+        else:
+            shape, fortran_order, dtype = (
+                np.lib.format.read_array_header_2_0(fid)
+            )
+        offset = fid.tell()
+
+    if np.prod(shape) == 0:
+        return np.empty(shape, dtype=dtype)
+
+    return np.memmap(
+        filename,
+        dtype=dtype,
+        mode="r",
+        shape=shape,
+        order="F" if fortran_order else "C",
+        offset=offset,
+    )
+
+
+class _FileIndex:
+    """
+    Index of the db-referenced files of a project.
+
+    File names are stored relative to the root folder, as a tree of
+    interned folder names: each folder is stored once, and each file only
+    keeps the number of its folder and its own name. These are stored in
+    NumPy arrays, with all names in a single byte array, which keeps the
+    index small for very large projects. Listing every file under a given
+    folder only looks at the files of this folder. Absolute file names are
+    built on demand.
+    """
+
+    class _Folder:
+        """Node of the folder tree."""
+
+        __slots__ = ["parent", "name", "children", "number"]
+
+        def __init__(self, parent: Any, name: str, number: int):
+            self.parent = parent
+            self.name = name
+            self.children = {}  # type: Dict[str, Any]
+            self.number = number
+
+    def __init__(self, root_folder: str):
+        self.root_folder = root_folder
+        self._root = _FileIndex._Folder(None, "", 0)
+        self._folders = [self._root]  # Indexed by folder number
+
+        # Compacted storage, in insertion order. Moved files keep their
+        # former entry with an ID of -1.
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._folder_numbers = np.zeros(0, dtype=np.int32)
+        self._name_offsets = np.zeros(1, dtype=np.int64)
+        self._names = np.zeros(0, dtype=np.uint8)
+        # Sort orders of the compacted storage, for lookups
+        self._by_id = np.zeros(0, dtype=np.int64)
+        self._sorted_ids = np.zeros(0, dtype=np.int64)
+        self._by_folder = np.zeros(0, dtype=np.int64)
+        self._sorted_folder_numbers = np.zeros(0, dtype=np.int32)
+
+        # Files added since the last compaction: ID -> (folder, name)
+        self._pending = {}  # type: Dict[int, Tuple[int, str]]
+
+        # Absolute path of each folder, with a trailing /
+        self._folder_paths = [root_folder + "/"]
+        self._folder_path_array = np.zeros(0, dtype=object)
+
+        # Incremented on each change, so that users can cache file names
+        self.version = 0
+
+    def __contains__(self, dbfid: int) -> bool:
+        return dbfid in self._pending or self._position(dbfid) != -1
+
+    def __len__(self) -> int:
+        self.compact()
+        return int(np.count_nonzero(self._ids >= 0))
+
+    def _position(self, dbfid: int) -> int:
+        """Return the position of a file in the compacted storage, or -1."""
+        i = int(np.searchsorted(self._sorted_ids, dbfid))
+        if i < len(self._sorted_ids) and self._sorted_ids[i] == dbfid:
+            return int(self._by_id[i])
+        return -1
+
+    def add(self, dbfid: int, components: List[str]) -> None:
+        """Add or move a file, given its path components from root."""
+        dbfid = int(dbfid)
+        if dbfid in self and self.components(dbfid) == components:
+            return  # Already there, e.g. when a file is overwritten
+
+        folder = self._root
+        for name in components[:-1]:
+            try:
+                folder = folder.children[name]
+            except KeyError:
+                name = sys.intern(name)
+                folder.children[name] = _FileIndex._Folder(
+                    folder, name, len(self._folders)
+                )
+                folder = folder.children[name]
+                self._folders.append(folder)
+                self._folder_paths.append(
+                    self._folder_paths[folder.parent.number] + name + "/"
+                )
+
+        self._pending[dbfid] = (folder.number, components[-1])
+        self.version += 1
+        if len(self._pending) >= 65536:
+            self.compact()
+
+    def compact(self) -> None:
+        """Move the files added since the last compaction to the arrays."""
+        if len(self._pending) == 0:
+            return
+
+        new_ids = np.fromiter(self._pending, np.int64, len(self._pending))
+
+        # Forget the former entries of moved files
+        i = np.searchsorted(self._sorted_ids, new_ids)
+        i = i[i < len(self._sorted_ids)]
+        i = i[np.isin(self._sorted_ids[i], new_ids)]
+        self._ids[self._by_id[i]] = -1
+
+        new_names = [
+            value[1].encode("utf-8") for value in self._pending.values()
+        ]
+        new_offsets = np.cumsum([len(name) for name in new_names])
+        self._ids = np.concatenate((self._ids, new_ids))
+        self._folder_numbers = np.concatenate(
+            (
+                self._folder_numbers,
+                np.array(
+                    [value[0] for value in self._pending.values()],
+                    dtype=np.int32,
+                ),
+            )
+        )
+        self._name_offsets = np.concatenate(
+            (self._name_offsets, self._name_offsets[-1] + new_offsets)
+        )
+        self._names = np.concatenate(
+            (self._names, np.frombuffer(b"".join(new_names), np.uint8))
+        )
+        self._pending = {}
+
+        self._by_id = np.argsort(self._ids)
+        self._sorted_ids = self._ids[self._by_id]
+        self._by_folder = np.argsort(self._folder_numbers, kind="stable")
+        self._sorted_folder_numbers = self._folder_numbers[self._by_folder]
+
+    def components(self, dbfid: int) -> List[str]:
+        """Return the path components of a file, relative to root."""
+        if dbfid in self._pending:
+            folder_number, name = self._pending[dbfid]
+        else:
+            position = self._position(dbfid)
+            if position == -1:
+                raise KeyError(dbfid)
+            folder_number = self._folder_numbers[position]
+            start, stop = self._name_offsets[position : position + 2]
+            name = self._names[start:stop].tobytes().decode("utf-8")
+
+        folder = self._folders[folder_number]
+        components = [name]
+        while folder is not self._root:
+            components.append(folder.name)
+            folder = folder.parent
+        return components[::-1]
+
+    def path(self, dbfid: int) -> str:
+        """Return the absolute file name of a file."""
+        if dbfid not in self:
+            raise KeyError(dbfid)
+        return self.paths([dbfid])[0]
+
+    def paths(self, ids: Any) -> List[str]:
+        """
+        Return the absolute file names of files, or '' if not indexed.
+
+        The names are built from the path of their folder, with array
+        lookups for the compacted files, so that this is fast for many IDs.
+        """
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        out = np.full(len(ids), "", dtype=object)
+
+        if len(self._sorted_ids) > 0:
+            i = np.searchsorted(self._sorted_ids, ids)
+            i[i == len(self._sorted_ids)] = 0
+            found = np.flatnonzero(self._sorted_ids[i] == ids)
+            positions = self._by_id[i[found]]
+            if len(self._folder_path_array) != len(self._folder_paths):
+                self._folder_path_array = np.array(
+                    self._folder_paths, dtype=object
+                )
+            prefixes = np.take(
+                self._folder_path_array, self._folder_numbers[positions]
+            )
+            names = memoryview(self._names)
+            out[found] = [
+                prefix + str(names[start:stop], "utf-8")
+                for prefix, start, stop in zip(
+                    prefixes,
+                    self._name_offsets[positions].tolist(),
+                    self._name_offsets[positions + 1].tolist(),
+                )
+            ]
+
+        if len(self._pending) > 0:
+            for j, dbfid in enumerate(ids.tolist()):
+                if dbfid in self._pending:
+                    folder_number, name = self._pending[dbfid]
+                    out[j] = self._folder_paths[folder_number] + name
+
+        return out.tolist()
+
+    def ids(self) -> List[int]:
+        """Return the IDs of every indexed file."""
+        self.compact()
+        return self._sorted_ids[self._sorted_ids >= 0].tolist()
+
+    def ids_under(self, components: List[str]) -> List[int]:
+        """Return the IDs of every file under a folder, recursively."""
+        self.compact()
+        folder = self._root
+        for name in components:
+            try:
+                folder = folder.children[name]
+            except KeyError:
+                return []
+
+        ids = []  # type: List[int]
+        folders = [folder]
+        while len(folders) > 0:
+            folder = folders.pop()
+            start, stop = np.searchsorted(
+                self._sorted_folder_numbers,
+                [folder.number, folder.number + 1],
+            )
+            folder_ids = self._ids[self._by_folder[start:stop]]
+            ids.extend(folder_ids[folder_ids >= 0].tolist())
+            folders.extend(folder.children.values())
+        return ids
+
+    def items(self):
+        """Iterate over (ID, absolute file name) tuples."""
+        for dbfid in self.ids():
+            yield dbfid, self.path(dbfid)
+
+
+class _LocalCache:
+    """
+    Read-through cache of root folder files on a local disk.
+
+    Cached files are validated against the root folder by size and
+    modification time on every access, and the least recently used files
+    are evicted when the cache exceeds its maximal size. The modification
+    time of each local copy is its last access time, so that cache hits
+    don't rewrite the index. The index is only rewritten under a lock file,
+    after merging the changes of the other processes that share the cache.
+    A cache can also be used by several threads.
+    """
+
+    # Files accessed this recently (s) are not evicted, since another
+    # process may be reading them.
+    _EVICTION_DELAY = 60.0
+
+    def __init__(self, root_folder: str, cache_folder: str, max_size: float):
+        self.root_folder = root_folder
+        self.cache_folder = cache_folder
+        self.max_size = max_size
+        self._index_file = os.path.join(cache_folder, "cache_index.json")
+        os.makedirs(cache_folder, exist_ok=True)
+        self._lock = threading.Lock()
+        self._read_index()
+
+    def _local_file_name(self, filename: str) -> str:
+        """Return the cache key of a file, or '' if it can't be cached."""
+        relative_filename = os.path.relpath(filename, self.root_folder)
+        if relative_filename.startswith(".."):
+            return ""
+        return relative_filename
+
+    def _is_valid(self, key: str, stat: os.stat_result) -> bool:
+        """Return whether the local copy of a file is up to date."""
+        entry = self._index.get(key, {})
+        return (
+            entry.get("Size") == stat.st_size
+            and entry.get("MTime") == stat.st_mtime_ns
+            and os.path.exists(os.path.join(self.cache_folder, key))
+        )
+
+    def fetch(self, filename: str) -> str:
+        """Return a valid local copy of a file, copying it if needed."""
+        with self._lock:
+            return self._fetch(filename)
+
+    def _fetch(self, filename: str) -> str:
+        """Fetch a file. The thread lock must be held."""
+        key = self._local_file_name(filename)
+        if key == "":
+            return filename
+
+        local_file = os.path.join(self.cache_folder, key)
+        stat = os.stat(filename)
+        if not self._is_valid(key, stat):
+            with _file_lock(self._index_file):
+                # Another process may have copied it in the meantime
+                self._read_index()
+                if not self._is_valid(key, stat):
+                    self._copy(filename, local_file)
+                    self._index[key] = {
+                        "Size": stat.st_size,
+                        "MTime": stat.st_mtime_ns,
+                    }
+                    self._evict(keep=key)
+                    self._write_index()
+                    return local_file
+
+        try:
+            os.utime(local_file)  # Mark as recently used
+        except FileNotFoundError:
+            # Evicted by another process in the meantime
+            self._index.pop(key, None)
+            return self._fetch(filename)
+        return local_file
+
+    def _copy(self, filename: str, local_file: str) -> None:
+        """Copy a file atomically to the cache."""
+        os.makedirs(os.path.dirname(local_file), exist_ok=True)
+        temp_file = _make_temp_file(local_file)
+        try:
+            shutil.copyfile(filename, temp_file)
+            os.replace(temp_file, local_file)
+        except BaseException:
+            os.remove(temp_file)
+            raise
+
+    def invalidate(self, filename: str) -> None:
+        """Remove a file from the cache."""
+        key = self._local_file_name(filename)
+        with self._lock, _file_lock(self._index_file):
+            self._read_index()
+            if key in self._index:
+                self._remove(key)
+                self._write_index()
+
+    def _remove(self, key: str) -> None:
+        """Remove a cached file and its index entry."""
+        try:
+            os.remove(os.path.join(self.cache_folder, key))
+        except FileNotFoundError:
+            pass
+        self._index.pop(key)
+
+    def _evict(self, keep: str) -> None:
+        """
+        Evict the least recently used files until the cache fits.
+
+        The thread lock and the lock file must be held.
+        """
+        last_accesses = {}  # type: Dict[str, float]
+        for key in list(self._index):
+            try:
+                last_accesses[key] = os.stat(
+                    os.path.join(self.cache_folder, key)
+                ).st_mtime
+            except FileNotFoundError:
+                self._index.pop(key)  # Removed outside of the cache
+
+        total_size = sum(entry["Size"] for entry in self._index.values())
+        now = time.time()
+        for key in sorted(last_accesses, key=lambda k: last_accesses[k]):
+            if (
+                total_size <= self.max_size
+                or now - last_accesses[key] < self._EVICTION_DELAY
+            ):
+                break
+            if key != keep:
+                size = self._index[key]["Size"]
+                try:
+                    self._remove(key)
+                except OSError:
+                    continue  # Still open by another process
+                total_size -= size
+
+    def _read_index(self) -> None:
+        """Read the cache index, as written by any process."""
+        try:
+            with open(self._index_file, "r") as fid:
+                self._index = json.load(fid)  # type: Dict[str, Any]
+        except FileNotFoundError:
+            self._index = {}
+
+    def _write_index(self) -> None:
+        """
+        Write the cache index atomically.
+
+        The thread lock and the lock file must be held.
+        """
+        _write_json_atomically(self._index_file, self._index)
 
 
 class DBInterface:
@@ -43,39 +955,97 @@ class DBInterface:
     project
         Project label, for example 'FC_XX16E'.
     user
-        Optional. Database username. If none is supplied, a dialog box asks
-        the user for their credentials.
+        Optional. Database username. If none is supplied, it is read from the
+        DBINTERFACE_USER and DBINTERFACE_PASSWORD environment variables, or
+        else a dialog box asks the user for their credentials.
     password
         Optional. Database password
     root_folder
         Optional. Project's root folder, where all data files are stored. If
-        none is given, a dialog box asks the user to point to this folder.
+        none is given, it is read from the DBINTERFACE_ROOT_FOLDER
+        environment variable, or else a dialog box asks the user to point to
+        this folder.
     url
         Optional. Database url.
     debug
         Optional. True to print out the answers from the database.
+    manifest
+        Optional. True to maintain a manifest of the size, modification time
+        and content hash of every referenced file, stored in the SQLite
+        database `root_folder/.dbinterface_manifest.sqlite`. See
+        `get_changed_ids`.
+    index_cache
+        Optional. True to share the file index between processes and users
+        through a SQLite cache stored in
+        `root_folder/.dbinterface_index.sqlite`. The root folder is then
+        walked only when the cache is older than `index_cache_max_age`, or
+        when the modification time of a folder down to the session level
+        changed, and concurrent processes wait for a single scan instead of
+        walking the folder each. This relies on the file locking of the
+        file system that hosts the root folder.
+    index_cache_max_age
+        Optional. Age in seconds after which the shared file index is
+        considered stale and the root folder is walked again.
+    headless
+        Optional. True to never open a dialog box, for example in cluster
+        jobs. Missing credentials, root folder or file names then raise a
+        ValueError instead.
+    packed
+        Optional. True to save new files in one pack per session instead of
+        one file per entry, which is much faster to scan, copy and open on
+        network shares. See `save`, `pack_session` and `unpack_session`.
+    cache_folder
+        Optional. Local folder where the files read by `load` are cached,
+        for example on a local SSD when the root folder is on a network
+        share. Cached files are validated against the root folder by size
+        and modification time. Default is no cache.
+    cache_size
+        Optional. Maximal size of the local cache in bytes. The least
+        recently used files are evicted when it is exceeded, except those
+        used in the last minute. The cache folder can be shared by several
+        processes.
 
     """
 
+    @property
+    def table(self) -> pd.DataFrame:
+        """
+        Return the project's table, with the file name of each entry.
+
+        The FileName column is built from the file index on the first
+        access, and kept until the table or the file index change.
+        """
+        if (
+            self._table_key is None
+            or self._table_key[0] is not self._table
+            or self._table_key[1] is not self._files
+            or self._table_key[2] != self._files.version
+        ):
+            df = self._table.copy()
+            df["FileName"] = self._files.paths(df.index)
+            self._table_with_file_names = df
+            self._table_key = (self._table, self._files, self._files.version)
+        return self._table_with_file_names
+
     @property
     def participants(self) -> List[str]:
         """Return a list of all participant labels in the project."""
-        return self.table["Participant"].unique().tolist()
+        return self._table["Participant"].unique().tolist()
 
     @property
     def sessions(self) -> List[str]:
         """Return a list of all session labels in the project."""
-        return self.table["Session"].unique().tolist()
+        return self._table["Session"].unique().tolist()
 
     @property
     def trials(self) -> List[str]:
         """Return a list of all trial labels in the project."""
-        return self.table["Trial"].unique().tolist()
+        return self._table["Trial"].unique().tolist()
 
     @property
     def files(self) -> List[str]:
         """Return a list of all file labels in the project."""
-        return self.table["File"].unique().tolist()
+        return self._table["File"].unique().tolist()
 
     def __init__(
         self,
@@ -85,15 +1055,34 @@ class DBInterface:
         root_folder: str = "",
         url: str = "https://mosa.uqam.ca/db/cgi-bin/api.py",
         debug: bool = False,
+        manifest: bool = False,
+        index_cache: bool = False,
+        index_cache_max_age: float = 3600.0,
+        headless: bool = False,
+        packed: bool = False,
+        cache_folder: str = "",
+        cache_size: float = 10e9,
     ):
         """Init."""
         # Simple assignations
         self.project = project
         self.url = url
         self.debug = debug
+        self.manifest = manifest
+        self.index_cache = index_cache
+        self.index_cache_max_age = index_cache_max_age
+        self.headless = headless
+        self.packed = packed
+        self._cache = None  # type: Optional[_LocalCache]
+        self._table_key = None  # type: Optional[Tuple[Any, Any, int]]
 
         # Get username and password if not supplied
+        if user == "" and "DBINTERFACE_USER" in os.environ:
+            user = os.environ["DBINTERFACE_USER"]
+            password = os.environ.get("DBINTERFACE_PASSWORD", "")
+
         if user == "":
+            self._check_not_headless("user")
             self.user, self._password = ktk.gui.get_credentials()
         else:
             self.user = user
@@ -101,6 +1090,10 @@ class DBInterface:
 
         # Assign root folder
         if root_folder == "":
+            root_folder = os.environ.get("DBINTERFACE_ROOT_FOLDER", "")
+
+        if root_folder == "":
+            self._check_not_headless("root_folder")
             li.message(
                 "Please select the folder that contains the " "project data."
             )
@@ -109,10 +1102,23 @@ class DBInterface:
         else:
             self.root_folder = root_folder
 
+        if cache_folder != "":
+            self._cache = _LocalCache(
+                self.root_folder, cache_folder, cache_size
+            )
+
         # Assign tables
         self.tables = dict()  # type: Dict[str, pd.DataFrame]
         self.refresh()
 
+    def _check_not_headless(self, parameter: str) -> None:
+        """Raise a ValueError if a dialog is needed in headless mode."""
+        if self.headless:
+            raise ValueError(
+                f"No {parameter} was supplied and this DBInterface is "
+                "headless."
+            )
+
     def __repr__(self) -> str:
         """Generate the instance's developer representation."""
         s = f"--------------------------------------------------\n"
@@ -137,21 +1143,47 @@ class DBInterface:
         s += f"--------------------------------------------------\n"
         return s
 
-    def _scan_files(self) -> pd.DataFrame:
+    def _scan_files(self) -> "_FileIndex":
         # Scan all files in root folder
-        dict_files = {}
-        dict_files["ID"] = []
-        dict_files["FileName"] = []
+        index = _FileIndex(self.root_folder)
         self.duplicates = []
 
         warned_once = False
         for folder, _, files in os.walk(self.root_folder):
             if len(files) > 0:
+                relative_folder = os.path.relpath(folder, self.root_folder)
+                if relative_folder == ".":
+                    components = []  # type: List[str]
+                else:
+                    components = relative_folder.split(os.sep)
+
+                # Packs are indexed as folders that contain their members
+                entries = []  # type: List[Tuple[str, List[str], str]]
                 for file in files:
+                    if file.endswith(_PACK_EXTENSION):
+                        try:
+                            with _open_pack(
+                                os.path.join(folder, file)
+                            ) as pack:
+                                members = pack.namelist()
+                        except (zipfile.BadZipFile, OSError) as error:
+                            warnings.warn(
+                                f"Could not read the pack {file} in "
+                                f"{folder}, its files are skipped: {error}"
+                            )
+                            continue
+                        entries.extend(
+                            (folder + "/" + file, components + [file], m)
+                            for m in members
+                        )
+                    else:
+                        entries.append((folder, components, file))
+
+                for file_folder, file_components, file in entries:
                     if "dbfid" in file:
                         try:
                             dbfid = int(file.split("dbfid")[1].split("n")[0])
-                            if dbfid in dict_files["ID"]:
+                            if dbfid in index:
                                 # Duplicate file
 
                                 if warned_once is False:
@@ -162,24 +1194,548 @@ class DBInterface:
                                     warned_once = True
                                     self.duplicates = []
 
-                                dup_index = dict_files["ID"].index(dbfid)
-                                dup_file = dict_files["FileName"][dup_index]
-
                                 self.duplicates.append(
-                                    (folder + "/" + file, dup_file)
+                                    (
+                                        file_folder + "/" + file,
+                                        index.path(dbfid),
+                                    )
                                 )
 
                             else:
-                                dict_files["ID"].append(dbfid)
-                                dict_files["FileName"].append(
-                                    folder + "/" + file
-                                )
+                                index.add(dbfid, file_components + [file])
                         except ValueError:
                             pass  # Could not extract an int. Maybe there was
                             # a dbfid string in the file name by chance.
 
-        # Convert to a Pandas DataFrame
-        return pd.DataFrame(dict_files).set_index("ID")
+        index.compact()
+
+        if self.manifest:
+            self._update_manifest(dict(index.items()), full_scan=True)
+
+        return index
+
+    @property
+    def _index_cache_file(self) -> str:
+        """Return the path of the project's shared file index cache."""
+        return os.path.join(self.root_folder, ".dbinterface_index.sqlite")
+
+    def _connect_index_cache(self) -> sqlite3.Connection:
+        """Open the shared file index cache, creating it if needed."""
+        connection = sqlite3.connect(
+            self._index_cache_file, timeout=600, isolation_level=None
+        )
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS files "
+            "(id INTEGER PRIMARY KEY, filename TEXT)"
+        )
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS duplicates "
+            "(filename TEXT, duplicate_of TEXT)"
+        )
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value)"
+        )
+        return connection
+
+    def _folder_signature(self) -> Dict[str, int]:
+        """
+        Return the modification times of the project's folders.
+
+        Only the folders down to the session level of the `save` layout
+        (root_folder/file/participant/session) are considered. Adding or
+        removing a file in any of these folders changes the signature, at
+        the cost of one stat per folder instead of a walk of every file.
+        The root folder's own modification time is ignored, since the
+        cache, the manifest and their lock files are written there.
+        """
+        signature = {}  # type: Dict[str, int]
+        folders = [("", self.root_folder)]
+        for depth in range(4):
+            subfolders = []
+            for relative_folder, folder in folders:
+                try:
+                    if depth > 0:
+                        signature[relative_folder] = os.stat(
+                            folder
+                        ).st_mtime_ns
+                    if depth == 3:
+                        continue
+                    with os.scandir(folder) as entries:
+                        for entry in entries:
+                            if entry.is_dir():
+                                subfolders.append(
+                                    (
+                                        (relative_folder + "/" + entry.name)
+                                        if relative_folder != ""
+                                        else entry.name,
+                                        entry.path,
+                                    )
+                                )
+                except FileNotFoundError:
+                    pass  # Deleted meanwhile
+            folders = subfolders
+        return signature
+
+    def _index_files(self, rescan: bool = False) -> "_FileIndex":
+        """Return the file index, from the shared cache if it is fresh."""
+        if not self.index_cache:
+            return self._scan_files()
+
+        if not rescan:
+            files = self._read_index_cache(self._folder_signature())
+            if files is not None:
+                return files
+
+        # Hold a lock while scanning, so that concurrent processes wait for
+        # this scan instead of walking the same folders. This is a lock
+        # file and not a SQLite transaction, which would time out on long
+        # scans.
+        with _file_lock(self._index_cache_file):
+            signature = self._folder_signature()
+            files = None
+            if not rescan:
+                # Another process may have scanned while we waited.
+                files = self._read_index_cache(signature)
+            if files is None:
+                files = self._scan_files()
+                self._write_index_cache(files, signature)
+
+        return files
+
+    def _read_index_cache(
+        self, signature: Dict[str, int]
+    ) -> Union["_FileIndex", None]:
+        """Read the shared file index, or return None if it is stale."""
+        with closing(self._connect_index_cache()) as connection:
+            connection.execute("BEGIN")
+            try:
+                info = dict(
+                    connection.execute("SELECT key, value FROM info")
+                )
+                if (
+                    "Scanned" not in info
+                    or time.time() - info["Scanned"]
+                    > self.index_cache_max_age
+                    or json.loads(info.get("Signature", "null"))
+                    != signature
+                ):
+                    return None
+
+                index = _FileIndex(self.root_folder)
+                for dbfid, filename in connection.execute(
+                    "SELECT id, filename FROM files"
+                ):
+                    index.add(dbfid, filename.split("/"))
+                index.compact()
+
+                self.duplicates = [
+                    (
+                        self.root_folder + "/" + filename,
+                        self.root_folder + "/" + duplicate_of,
+                    )
+                    for filename, duplicate_of in connection.execute(
+                        "SELECT filename, duplicate_of FROM duplicates"
+                    )
+                ]
+            finally:
+                connection.execute("COMMIT")
+
+        if len(self.duplicates) > 0:
+            warnings.warn("Duplicate file(s) found. See duplicates property.")
+
+        return index
+
+    def _write_index_cache(
+        self, files: "_FileIndex", signature: Dict[str, int]
+    ) -> None:
+        """Replace the shared file index."""
+        with closing(self._connect_index_cache()) as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                self._write_index_cache_tables(connection, files, signature)
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+
+    def _write_index_cache_tables(
+        self,
+        connection: sqlite3.Connection,
+        files: "_FileIndex",
+        signature: Dict[str, int],
+    ) -> None:
+        """Replace the shared file index tables, in a transaction."""
+        connection.execute("DELETE FROM files")
+        connection.execute("DELETE FROM duplicates")
+        connection.executemany(
+            "INSERT INTO files (id, filename) VALUES (?, ?)",
+            [
+                (dbfid, "/".join(files.components(dbfid)))
+                for dbfid in files.ids()
+            ],
+        )
+        connection.executemany(
+            "INSERT INTO duplicates (filename, duplicate_of) VALUES (?, ?)",
+            [
+                (
+                    self._relative_file_name(filename),
+                    self._relative_file_name(duplicate_of),
+                )
+                for filename, duplicate_of in self.duplicates
+            ],
+        )
+        connection.execute(
+            "INSERT OR REPLACE INTO info (key, value) VALUES ('Scanned', ?)",
+            (time.time(),),
+        )
+        connection.execute(
+            "INSERT OR REPLACE INTO info (key, value) "
+            "VALUES ('Signature', ?)",
+            (json.dumps(signature),),
+        )
+
+    def _relative_file_name(self, filename: str) -> str:
+        """Return a file name relative to root_folder, with / separators."""
+        return os.path.relpath(filename, self.root_folder).replace(
+            os.sep, "/"
+        )
+
+    def _register_file(self, dbfid: int, filename: str) -> None:
+        """Add or update a single file in the index, without rescanning."""
+        self._files.add(
+            dbfid, self._relative_file_name(filename).split("/")
+        )
+
+        if self.index_cache:
+            # The folders that contain the file changed because of it: update
+            # their signature so that other processes don't rescan for it.
+            folder = os.path.dirname(_split_packed_file_name(filename)[0])
+            components = self._relative_file_name(folder).split("/")
+            if components == ["."]:
+                components = []
+            updated_signature = {}
+            for depth in range(1, min(len(components), 3) + 1):
+                updated_signature["/".join(components[:depth])] = os.stat(
+                    os.path.join(self.root_folder, *components[:depth])
+                ).st_mtime_ns
+
+            with closing(self._connect_index_cache()) as connection:
+                connection.execute("BEGIN IMMEDIATE")
+                try:
+                    connection.execute(
+                        "INSERT OR REPLACE INTO files (id, filename) "
+                        "VALUES (?, ?)",
+                        (int(dbfid), self._relative_file_name(filename)),
+                    )
+                    row = connection.execute(
+                        "SELECT value FROM info WHERE key = 'Signature'"
+                    ).fetchone()
+                    if row is not None:
+                        signature = json.loads(row[0])
+                        signature.update(updated_signature)
+                        connection.execute(
+                            "UPDATE info SET value = ? "
+                            "WHERE key = 'Signature'",
+                            (json.dumps(signature),),
+                        )
+                    connection.execute("COMMIT")
+                except BaseException:
+                    connection.execute("ROLLBACK")
+                    raise
+
+        if self.manifest:
+            self._update_manifest({dbfid: filename})
+
+    @property
+    def _manifest_file(self) -> str:
+        """Return the path of the project's manifest database."""
+        return os.path.join(self.root_folder, ".dbinterface_manifest.sqlite")
+
+    def _connect_manifest(self) -> sqlite3.Connection:
+        """Open the manifest database, creating it if needed."""
+        created = not os.path.exists(self._manifest_file)
+        connection = sqlite3.connect(
+            self._manifest_file, timeout=600, isolation_level=None
+        )
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries "
+            "(id INTEGER PRIMARY KEY, filename TEXT, size INTEGER, "
+            "mtime INTEGER, hash TEXT, version INTEGER, deleted INTEGER)"
+        )
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS entries_version "
+            "ON entries (version)"
+        )
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value)"
+        )
+        if created:
+            self._import_json_manifest(connection)
+        return connection
+
+    def _import_json_manifest(self, connection: sqlite3.Connection) -> None:
+        """Import the manifest of older versions, which was a json file."""
+        json_file = os.path.join(
+            self.root_folder, ".dbinterface_manifest.json"
+        )
+        try:
+            with open(json_file, "r") as fid:
+                manifest = json.load(fid)
+        except FileNotFoundError:
+            return
+
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have imported it meanwhile
+            if connection.execute("SELECT * FROM info").fetchone() is None:
+                connection.executemany(
+                    "INSERT INTO entries "
+                    "(id, filename, size, mtime, hash, version, deleted) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (
+                            int(key),
+                            entry["FileName"],
+                            entry["Size"],
+                            entry["MTime"],
+                            entry["Hash"],
+                            entry["Version"],
+                            int(entry.get("Deleted", False)),
+                        )
+                        for key, entry in manifest["Entries"].items()
+                    ],
+                )
+                connection.execute(
+                    "INSERT INTO info (key, value) VALUES ('Version', ?)",
+                    (manifest["Version"],),
+                )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    def _update_manifest(
+        self, files: Dict[int, str], full_scan: bool = False
+    ) -> None:
+        """
+        Update the manifest entries of the given files.
+
+        Files which size and modification time did not change since the last
+        update are not hashed again. If `full_scan` is True, `files` is
+        considered to contain every file of the project, and the entries of
+        files that disappeared are marked as deleted.
+
+        Only the entries of the given files are read and written, so that
+        saving a file doesn't cost a rewrite of the whole manifest. Files are
+        hashed outside of any transaction, then the entries are compared and
+        written in a single transaction, so that concurrent processes never
+        lose each other's updates.
+        """
+        packs = {}  # type: Dict[str, Any]
+        updates = {}  # type: Dict[int, Tuple[str, int, int, str]]
+
+        with closing(self._connect_manifest()) as connection:
+            if full_scan:
+                snapshot = {
+                    row[0]: row[1:]
+                    for row in connection.execute(
+                        "SELECT id, filename, size, mtime, deleted "
+                        "FROM entries"
+                    )
+                }
+            else:
+                snapshot = {}
+                for dbfid in files:
+                    row = connection.execute(
+                        "SELECT filename, size, mtime, deleted "
+                        "FROM entries WHERE id = ?",
+                        (int(dbfid),),
+                    ).fetchone()
+                    if row is not None:
+                        snapshot[int(dbfid)] = row
+
+            for dbfid, filename in files.items():
+                try:
+                    size, mtime = _stat_file(filename, packs)
+                except FileNotFoundError:
+                    continue
+                relative_filename = self._relative_file_name(filename)
+                if snapshot.get(int(dbfid)) == (
+                    relative_filename,
+                    size,
+                    mtime,
+                    0,
+                ):
+                    continue  # Unchanged, don't even hash it.
+
+                updates[int(dbfid)] = (
+                    relative_filename,
+                    size,
+                    mtime,
+                    _hash_file(filename, packs),
+                )
+
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                self._write_manifest_entries(
+                    connection, updates, files if full_scan else None, packs
+                )
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+
+    def _write_manifest_entries(
+        self,
+        connection: sqlite3.Connection,
+        updates: Dict[int, Tuple[str, int, int, str]],
+        files: Optional[Dict[int, str]],
+        packs: Dict[str, Any],
+    ) -> None:
+        """
+        Write updated manifest entries, in a transaction.
+
+        If `files` is given, it contains every file of the project, and the
+        entries of the other files are marked as deleted.
+        """
+        row = connection.execute(
+            "SELECT value FROM info WHERE key = 'Version'"
+        ).fetchone()
+        version = (0 if row is None else row[0]) + 1
+        changed = False  # Anything that deserves a new version
+
+        for dbfid, (filename, size, mtime, file_hash) in updates.items():
+            entry = connection.execute(
+                "SELECT filename, hash, deleted FROM entries WHERE id = ?",
+                (dbfid,),
+            ).fetchone()
+            if entry == (filename, file_hash, 0):
+                # Touched but same content: not a change.
+                connection.execute(
+                    "UPDATE entries SET size = ?, mtime = ? WHERE id = ?",
+                    (size, mtime, dbfid),
+                )
+                continue
+
+            connection.execute(
+                "INSERT OR REPLACE INTO entries "
+                "(id, filename, size, mtime, hash, version, deleted) "
+                "VALUES (?, ?, ?, ?, ?, ?, 0)",
+                (dbfid, filename, size, mtime, file_hash, version),
+            )
+            changed = True
+
+        if files is not None:
+            for dbfid, filename in connection.execute(
+                "SELECT id, filename FROM entries WHERE deleted = 0"
+            ).fetchall():
+                if dbfid in files:
+                    continue
+                try:
+                    # It may have been saved after our scan.
+                    _stat_file(self.root_folder + "/" + filename, packs)
+                    continue
+                except FileNotFoundError:
+                    pass
+                connection.execute(
+                    "UPDATE entries SET deleted = 1, version = ? "
+                    "WHERE id = ?",
+                    (version, dbfid),
+                )
+                changed = True
+
+        if changed:
+            connection.execute(
+                "INSERT OR REPLACE INTO info (key, value) "
+                "VALUES ('Version', ?)",
+                (version,),
+            )
+
+    @property
+    def manifest_version(self) -> int:
+        """Return the current version of the project's manifest."""
+        with closing(self._connect_manifest()) as connection:
+            row = connection.execute(
+                "SELECT value FROM info WHERE key = 'Version'"
+            ).fetchone()
+        return 0 if row is None else row[0]
+
+    def get_changed_ids(self, since_version: int = 0) -> List[int]:
+        """
+        Return the file IDs that changed since a given manifest version.
+
+        This method requires the DBInterface to be created with
+        `manifest=True`. A typical usage is to store `manifest_version` after
+        processing a project, and to process only the files returned by
+        `get_changed_ids(stored_version)` the next time.
+
+        Parameters
+        ----------
+        since_version
+            Optional. Manifest version of the last processing. The default
+            returns every file ID ever recorded in the manifest.
+
+        Returns
+        -------
+        List[int]
+            The IDs of the files that were created, modified or deleted
+            after `since_version`. Deleted files are not in `table` anymore.
+
+        """
+        if not self.manifest:
+            raise ValueError(
+                "This DBInterface was not created with manifest=True."
+            )
+        with closing(self._connect_manifest()) as connection:
+            return [
+                row[0]
+                for row in connection.execute(
+                    "SELECT id FROM entries WHERE version > ? ORDER BY id",
+                    (since_version,),
+                )
+            ]
+
+    def find_files(
+        self, file: str, participant: str = "", session: str = ""
+    ) -> Dict[int, str]:
+        """
+        Find the files stored in a given folder of the project.
+
+        This method looks up the file index for the files stored under
+        `root_folder/file/participant/session`, which is where `save`
+        stores its files. It does not query the database and does not scan
+        the entire index, which makes it fast on very large projects. Files
+        that are stored elsewhere in the root folder are not found.
+
+        Parameters
+        ----------
+        file
+            File label (for example, 'Kinematics').
+        participant
+            Optional. Participant label (for example, 'P01').
+        session
+            Optional. Session label (for example, 'SB4320'). A former
+            parameter cannot be empty while a latter parameter is not.
+
+        Returns
+        -------
+        Dict[int, str]
+            A dict where the keys are the file IDs and the values are the
+            absolute file names.
+
+        """
+        components = [file, participant, session]
+        while components[-1] == "":
+            components.pop()
+        if "" in components:
+            raise ValueError(
+                "A former parameter cannot be empty while a latter "
+                "parameter is not."
+            )
+        return {
+            dbfid: self._files.path(dbfid)
+            for dbfid in self._files.ids_under(components)
+        }
 
     def get(
         self,
@@ -214,7 +1770,7 @@ class DBInterface:
 
         """
         # Assign the tables
-        df = self.table.reset_index()
+        df = self._table.reset_index()
 
         if participant != "":
             df = df[df["Participant"] == participant]
@@ -234,7 +1790,7 @@ class DBInterface:
         out["Trials"] = df["Trial"].unique().tolist()
         out["Files"] = df["File"].unique().tolist()
         out["IDs"] = df["ID"].unique().tolist()
-        filenames = df["FileName"].unique().tolist()
+        filenames = dict.fromkeys(self._files.paths(df["ID"]))
 
         out["FileNames"] = [
             filename for filename in filenames if filename != ""
@@ -251,6 +1807,30 @@ class DBInterface:
 
         return out
 
+    def _select(
+        self,
+        file: str,
+        participant: str = "",
+        session: str = "",
+        trial: str = "",
+    ) -> pd.DataFrame:
+        """
+        Return the rows of `table` of a file label that have a file.
+
+        Empty participant, session or trial labels select them all.
+        """
+        df = self._table
+        df = df[df["File"] == file]
+        if participant != "":
+            df = df[df["Participant"] == participant]
+        if session != "":
+            df = df[df["Session"] == session]
+        if trial != "":
+            df = df[df["Trial"] == trial]
+
+        df = df.assign(FileName=self._files.paths(df.index))
+        return df[df["FileName"] != ""]
+
     def _refresh_table(self) -> pd.DataFrame:
         """Fetch table on database and return a DataFrame."""
         global _module_user, _module_password
@@ -285,7 +1865,6 @@ class DBInterface:
                     ]
                 )
             df = df.set_index("ID")
-            df = df.join(self._files)
             df = df.fillna("")
 
             return df
@@ -294,10 +1873,20 @@ class DBInterface:
             print(json_text)
             raise ValueError("Unknown exception, see above.")
 
-    def refresh(self) -> None:
-        """Update from database and reindex files."""
-        self._files = self._scan_files()
-        self.table = self._refresh_table()
+    def refresh(self, rescan: bool = False) -> None:
+        """
+        Update from database and reindex files.
+
+        Parameters
+        ----------
+        rescan
+            Optional. True to walk the root folder even if the shared file
+            index is fresh. Has no effect if `index_cache` is False, since
+            the root folder is then walked on every refresh.
+
+        """
+        self._files = self._index_files(rescan)
+        self._table = self._refresh_table()
 
     def get_file_id(
         self, participant: str, session: str, trial: str, file: str
@@ -519,6 +2108,8 @@ class DBInterface:
         trial: str,
         file: str,
         variable: Any,
+        uncompressed_arrays: bool = False,
+        packed: Optional[bool] = None,
     ) -> str:
         """
         Save a variable to a db-referenced file.
@@ -538,6 +2129,11 @@ class DBInterface:
           to a file entry in the database, a file entry is created in the
           database, then the file is saved as in 2nd case.
 
+        In packed mode, new files are not written individually but in a
+        single pack per session, `root_folder/file/participant/session/
+        session.dbpack`. Files that already exist are overwritten where they
+        are, be it in a pack or not.
+
         Parameters
         ----------
         participant
@@ -550,6 +2146,16 @@ class DBInterface:
             File type label. For example, 'SyncedMarkers'
         variable
             Any variable that is supported by ktk.save
+        uncompressed_arrays
+            Optional. If `variable` is a TimeSeries, True to also store its
+            time and data arrays uncompressed in the ktk.zip file, so that
+            `load` can memory-map them when called with `data_keys` or
+            `time_range`. The file remains readable by ktk.load, but is
+            larger.
+        packed
+            Optional. True to save new files in a session pack, False to save
+            them as individual files. Default is the DBInterface's `packed`
+            attribute.
 
         Returns
         -------
@@ -557,6 +2163,8 @@ class DBInterface:
             The file path
         """
         dbfid = self.create_file_id(participant, session, trial, file)
+        if packed is None:
+            packed = self.packed
 
         # Set the filename
         file_record = self.get(participant, session, trial, file)
@@ -588,12 +2196,36 @@ class DBInterface:
                 session,
                 "dbfid" + str(dbfid) + "n_{" + str(trial) + "}" + ".ktk.zip",
             )
+            if packed:
+                folder, member = os.path.split(file_name)
+                file_name = (
+                    os.path.join(folder, session + _PACK_EXTENSION)
+                    + "/"
+                    + member
+                )
 
         # Save
-        ktk.save(file_name, variable)
+        pack_file, member = _split_packed_file_name(file_name)
+        if member == "":
+            ktk.save(file_name, variable)
+            if uncompressed_arrays and isinstance(variable, ktk.TimeSeries):
+                self._append_arrays(file_name, variable)
+        else:
+            with tempfile.TemporaryDirectory() as temp_folder:
+                temp_file = os.path.join(temp_folder, member)
+                ktk.save(temp_file, variable)
+                if uncompressed_arrays and isinstance(
+                    variable, ktk.TimeSeries
+                ):
+                    self._append_arrays(temp_file, variable)
+                _write_pack_members(pack_file, {dbfid: (member, temp_file)})
+
+        if self._cache is not None:
+            self._cache.invalidate(pack_file)
 
         # Refresh
-        self.refresh()
+        self._register_file(dbfid, file_name)
+        self._table = self._refresh_table()
 
         return file_name
 
@@ -603,6 +2235,8 @@ class DBInterface:
         session: str,
         trial: str,
         file: str,
+        data_keys: Optional[List[str]] = None,
+        time_range: Optional[Tuple[float, float]] = None,
     ) -> Any:
         """
         Load a variable from a db-referenced file.
@@ -610,6 +2244,12 @@ class DBInterface:
         This method load the ktk.zip file associated to a participant,
         session, trial and file.
 
+        If the file contains a TimeSeries, only a subset of it can be loaded
+        using `data_keys` and `time_range`. When the file was saved with
+        `uncompressed_arrays=True`, only the requested data is read from
+        disk, including when the file is in a pack; otherwise, the whole
+        file is loaded then subset.
+
         Parameters
         ----------
         participant
@@ -620,6 +2260,11 @@ class DBInterface:
             Trial label. For example, 'StaticR1'
         file
             File type label. For example, 'SyncedMarkers'
+        data_keys
+            Optional. TimeSeries data keys to load. Default is all keys.
+        time_range
+            Optional. Tuple (t0, t1) of the TimeSeries time range to load,
+            inclusively. Default is the whole TimeSeries.
 
         Returns
         -------
@@ -630,8 +2275,513 @@ class DBInterface:
         if filename == "":
             raise ValueError("No file is associated to this entry.")
         else:
+            return self._load_file(filename, data_keys, time_range)
+
+    def _load_file(
+        self,
+        filename: str,
+        data_keys: Optional[List[str]] = None,
+        time_range: Optional[Tuple[float, float]] = None,
+    ) -> Any:
+        """Load a ktk.zip file, which may be in a pack or in the cache."""
+        pack_file, member = _split_packed_file_name(filename)
+        if self._cache is not None:
+            pack_file = self._cache.fetch(pack_file)
+
+        if data_keys is None and time_range is None:
+            return self._load_whole_file(pack_file, member)
+        else:
+            return self._load_partial(pack_file, member, data_keys, time_range)
+
+    def _load_whole_file(self, filename: str, member: str = "") -> Any:
+        """Load a local ktk.zip file, or a member of a local pack."""
+        if member == "":
             return ktk.load(filename)
 
+        with tempfile.TemporaryDirectory() as temp_folder:
+            with _open_pack(filename) as pack:
+                temp_file = pack.extract(member, temp_folder)
+            return ktk.load(temp_file)
+
+    def prefetch(
+        self, participant: str = "", session: str = "", file: str = ""
+    ) -> None:
+        """
+        Copy files to the local cache ahead of time.
+
+        This method requires the DBInterface to be created with a
+        `cache_folder`. For example, `prefetch('P01', 'SB4320')` caches every
+        file of this session, so that subsequent calls to `load` run at
+        local disk speed.
+
+        Parameters
+        ----------
+        participant
+            Optional. Participant label. For example, 'P01'
+        session
+            Optional. Session label. For example, 'SB4320'
+        file
+            Optional. File type label. For example, 'SyncedMarkers'
+
+        """
+        if self._cache is None:
+            raise ValueError("This DBInterface has no cache_folder.")
+
+        self._fetch_files(
+            self.get(participant, session, file=file)["FileNames"]
+        )
+
+    def _fetch_files(self, filenames: List[str]) -> None:
+        """Copy files to the local cache, fetching each pack once."""
+        for pack_file in dict.fromkeys(
+            _split_packed_file_name(filename)[0] for filename in filenames
+        ):
+            self._cache.fetch(pack_file)
+
+    def _append_arrays(self, filename: str, ts: Any) -> None:
+        """Append the uncompressed arrays of a TimeSeries to a ktk.zip."""
+        header = {
+            "time_info": ts.time_info,
+            "data_info": ts.data_info,
+            "events": [[event.time, event.name] for event in ts.events],
+            "data_keys": list(ts.data),
+        }
+        with zipfile.ZipFile(filename, "a") as archive:
+            archive.writestr("arrays/header.json", json.dumps(header))
+            _write_array_member(archive, "arrays/time.npy", ts.time)
+            for i, key in enumerate(ts.data):
+                _write_array_member(
+                    archive, f"arrays/data{i}.npy", ts.data[key]
+                )
+
+    def _load_partial(
+        self,
+        filename: str,
+        member: str,
+        data_keys: Optional[List[str]],
+        time_range: Optional[Tuple[float, float]],
+    ) -> Any:
+        """
+        Load a subset of a TimeSeries from a ktk.zip file.
+
+        If `member` is not empty, the ktk.zip file is this member of the
+        pack `filename`, and its arrays are memory-mapped in place.
+
+        Files with and without uncompressed arrays give the same subset,
+        including the events:
+
+        >>> import tempfile
+        >>> ts = ktk.TimeSeries(time=np.arange(10) / 10)
+        >>> ts.data["Forces"] = np.arange(30.0).reshape(10, 3)
+        >>> ts = ts.add_event(0.1, "heel").add_event(0.4, "toe")
+        >>> filename = os.path.join(tempfile.mkdtemp(), "test.ktk.zip")
+        >>> ktk.save(filename, ts)
+        >>> db = DBInterface.__new__(DBInterface)
+        >>> whole = db._load_partial(filename, "", ["Forces"], (0.2, 0.5))
+        >>> db._append_arrays(filename, ts)
+        >>> mapped = db._load_partial(filename, "", ["Forces"], (0.2, 0.5))
+        >>> [(event.time, event.name) for event in mapped.events]
+        [(0.1, 'heel'), (0.4, 'toe')]
+        >>> mapped.events == whole.events
+        True
+        >>> np.array_equal(mapped.data["Forces"], whole.data["Forces"])
+        True
+
+        """
+        location = None  # type: Optional[Tuple[int, int]]
+        header = None
+        if member != "":
+            location = _locate_pack_member(filename, member)
+        if member == "" or location is not None:
+            with _open_archive(filename, location) as archive:
+                if "arrays/header.json" in archive.namelist():
+                    header = json.loads(archive.read("arrays/header.json"))
+
+        if header is None:
+            # No uncompressed arrays: load everything, then subset.
+            ts = self._load_whole_file(filename, member)
+            if not isinstance(ts, ktk.TimeSeries):
+                raise ValueError(
+                    "data_keys and time_range can only be used with "
+                    "TimeSeries."
+                )
+            if data_keys is not None:
+                ts = ts.get_subset(data_keys)
+            if time_range is not None:
+                ts = ts.get_ts_between_times(
+                    time_range[0], time_range[1], inclusive=True
+                )
+            return ts
+
+        if data_keys is None:
+            data_keys = header["data_keys"]
+        for key in data_keys:
+            if key not in header["data_keys"]:
+                raise KeyError(f"The TimeSeries has no data key {key}.")
+
+        time = _memmap_array_member(filename, "arrays/time.npy", location)
+        if time_range is None:
+            index = slice(0, len(time))
+        else:
+            index = slice(
+                np.searchsorted(time, time_range[0], side="left"),
+                np.searchsorted(time, time_range[1], side="right"),
+            )
+
+        ts = ktk.TimeSeries(time=np.array(time[index]))
+        ts.time_info = header["time_info"]
+        for key in data_keys:
+            i = header["data_keys"].index(key)
+            data = _memmap_array_member(
+                filename, f"arrays/data{i}.npy", location
+            )
+            ts.data[key] = np.array(data[index])
+        ts.data_info = {
+            key: value
+            for key, value in header["data_info"].items()
+            if key in data_keys
+        }
+        for event_time, event_name in header["events"]:
+            ts.add_event(event_time, event_name, in_place=True)
+        return ts
+
+    def load_stacked(
+        self,
+        file: str,
+        data_key: str,
+        participant: str = "",
+        session: str = "",
+        trial: str = "",
+        time: Optional[np.ndarray] = None,
+        max_workers: Optional[int] = None,
+    ) -> Tuple[np.ndarray, np.ndarray, pd.DataFrame]:
+        """
+        Load one data key of many TimeSeries into a single array.
+
+        Every matching TimeSeries is loaded in parallel, and its data is
+        written directly in its row of a preallocated array of shape
+        (n_trials, n_samples, ...). TimeSeries which time differs from the
+        common time base are linearly resampled on it; samples outside their
+        time range are filled with NaN.
+
+        Parameters
+        ----------
+        file
+            File label (for example, 'Kinematics').
+        data_key
+            TimeSeries data key to load (for example, 'Forces').
+        participant
+            Optional. Participant label to load. Default is all.
+        session
+            Optional. Session label to load. Default is all.
+        trial
+            Optional. Trial label to load. Default is all.
+        time
+            Optional. Common time base. Default is the time of the first
+            matching TimeSeries.
+        max_workers
+            Optional. Maximal number of files loaded in parallel. Default is
+            the ThreadPoolExecutor's default.
+
+        Returns
+        -------
+        Tuple[np.ndarray, np.ndarray, pd.DataFrame]
+            The common time base, the stacked data, and the rows of `table`
+            corresponding to each index of the stacked data's first axis.
+
+        """
+        metadata = self._select(
+            file, participant, session, trial
+        ).reset_index()
+
+        if len(metadata) == 0:
+            raise ValueError("No file is associated to these labels.")
+
+        filenames = metadata["FileName"].tolist()
+        if self._cache is not None:
+            # Fetch before the workers start, so that they only hit the cache
+            self._fetch_files(filenames)
+
+        first = self._load_file(filenames[0], [data_key])
+        if time is None:
+            time = np.array(first.time)
+        else:
+            time = np.asarray(time)
+
+        data = np.full(
+            (len(filenames), len(time)) + first.data[data_key].shape[1:],
+            np.nan,
+        )
+
+        def fill(i: int, ts: Any) -> None:
+            """Write a TimeSeries' data into row i, resampling if needed."""
+            values = ts.data[data_key]
+            if values.shape[1:] != data.shape[2:]:
+                raise ValueError(
+                    f"The data of {filenames[i]} has shape {values.shape}, "
+                    f"which is incompatible with {data.shape[2:]}."
+                )
+            if ts.time.shape == time.shape and np.array_equal(ts.time, time):
+                data[i] = values
+                return
+            # Interpolate each column directly into the output row.
+            row = data[i].reshape(len(time), -1)
+            values = values.reshape(len(ts.time), -1)
+            for j in range(values.shape[1]):
+                row[:, j] = np.interp(
+                    time, ts.time, values[:, j], left=np.nan, right=np.nan
+                )
+
+        def load_and_fill(i: int) -> None:
+            fill(i, self._load_file(filenames[i], [data_key]))
+
+        fill(0, first)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # list() propagates the workers' exceptions
+            list(executor.map(load_and_fill, range(1, len(filenames))))
+
+        return (time, data, metadata)
+
+    def export_dataset(
+        self,
+        path: str,
+        file: str,
+        participant: str = "",
+        session: str = "",
+        trial: str = "",
+        data_keys: Optional[List[str]] = None,
+    ) -> List[int]:
+        """
+        Export TimeSeries to a partitioned Parquet dataset.
+
+        Each matching TimeSeries is loaded one at a time and written to
+        `path/Participant=xxx/Session=xxx/dbfidxxxx.parquet`, with a Time
+        column, one column per data key (multidimensional data is split as
+        for TimeSeries.to_dataframe), and the Project, Trial, File and ID
+        metadata columns. Participant and Session are given by the
+        partitions. The dataset is then read with `read_dataset`.
+
+        The export is incremental: entries which file did not change since
+        the last export to the same path are not exported again, and the
+        exports of entries that were deleted or lost their file are removed.
+        Exports of entries that don't match the given labels are kept, so
+        that a dataset can be exported one participant or session at a
+        time. Partition values are
+        URL-encoded, as expected by pyarrow's hive partitioning. This
+        requires pyarrow.
+
+        Parameters
+        ----------
+        path
+            Folder of the dataset.
+        file
+            File label (for example, 'Kinematics').
+        participant
+            Optional. Participant label to export. Default is all.
+        session
+            Optional. Session label to export. Default is all.
+        trial
+            Optional. Trial label to export. Default is all.
+        data_keys
+            Optional. TimeSeries data keys to export. Default is all keys.
+            Every trial of a dataset should share the same data keys.
+
+        Returns
+        -------
+        List[int]
+            The IDs of the entries that were exported, excluding those that
+            were unchanged.
+
+        """
+        df = self._select(file, participant, session, trial)
+
+        os.makedirs(path, exist_ok=True)
+        manifest_file = os.path.join(path, "_export_manifest.json")
+        try:
+            with open(manifest_file, "r") as fid:
+                manifest = json.load(fid)
+        except FileNotFoundError:
+            manifest = {}
+
+        # Remove the exports of entries that were deleted or lost their file.
+        # Entries that are only outside the given labels are kept.
+        existing_ids = self._select(file).index
+        for key in list(manifest):
+            entry = manifest[key]
+            if (
+                entry.get("File", file) == file
+                and int(key) not in existing_ids
+            ):
+                output_file = os.path.join(path, entry["Output"])
+                try:
+                    os.remove(output_file)
+                    # Also remove the partition folders if now empty
+                    os.removedirs(os.path.dirname(output_file))
+                except OSError:
+                    pass
+                del manifest[key]
+        _write_json_atomically(manifest_file, manifest, indent="\t")
+
+        exported = []
+        packs = {}  # type: Dict[str, Any]
+        for dbfid, row in df.iterrows():
+            size, mtime = _stat_file(row["FileName"], packs)
+            file_hash = None  # type: Optional[str]
+            if _split_packed_file_name(row["FileName"])[1] != "":
+                # The pack's modification time changes when any of its
+                # members is saved: compare the member's checksum instead.
+                mtime = 0
+                file_hash = _hash_file(row["FileName"], packs)
+            output_file = os.path.join(
+                "Participant="
+                + urllib.parse.quote(str(row["Participant"]), safe=""),
+                "Session=" + urllib.parse.quote(str(row["Session"]), safe=""),
+                f"dbfid{dbfid}.parquet",
+            )
+            entry = manifest.get(str(dbfid), {})
+            if (
+                entry.get("Size") == size
+                and entry.get("MTime") == mtime
+                and entry.get("Hash") == file_hash
+                and entry.get("DataKeys") == data_keys
+                and entry.get("Output") == output_file
+                and os.path.exists(os.path.join(path, output_file))
+            ):
+                continue  # Unchanged
+
+            ts = self._load_file(row["FileName"], data_keys)
+            if not isinstance(ts, ktk.TimeSeries):
+                raise ValueError(
+                    f"The file {row['FileName']} does not contain a "
+                    "TimeSeries."
+                )
+
+            ts_df = ts.to_dataframe().reset_index(drop=True)
+            ts_df.insert(0, "Time", ts.time)
+            ts_df["Project"] = self.project
+            ts_df["Trial"] = row["Trial"]
+            ts_df["File"] = row["File"]
+            ts_df["ID"] = dbfid
+
+            # Remove the former export if the entry changed partition
+            if "Output" in entry and entry["Output"] != output_file:
+                try:
+                    os.remove(os.path.join(path, entry["Output"]))
+                except FileNotFoundError:
+                    pass
+
+            os.makedirs(
+                os.path.dirname(os.path.join(path, output_file)),
+                exist_ok=True,
+            )
+            pq.write_table(
+                pa.Table.from_pandas(ts_df, preserve_index=False),
+                os.path.join(path, output_file),
+            )
+
+            manifest[str(dbfid)] = {
+                "File": file,
+                "Size": size,
+                "MTime": mtime,
+                "Hash": file_hash,
+                "DataKeys": data_keys,
+                "Output": output_file,
+            }
+            exported.append(dbfid)
+
+            # Save the manifest as we go, so that an interrupted export
+            # resumes where it stopped.
+            _write_json_atomically(manifest_file, manifest, indent="\t")
+
+        return exported
+
+    def pack_session(self, file: str, participant: str, session: str) -> str:
+        """
+        Move the ktk.zip files of a session into the session's pack.
+
+        The ktk.zip files stored in `root_folder/file/participant/session`
+        are added to `root_folder/file/participant/session/session.dbpack`
+        and then deleted. Their content and IDs are unchanged.
+
+        Parameters
+        ----------
+        file
+            File label. For example, 'SyncedMarkers'
+        participant
+            Participant label. For example, 'P01'
+        session
+            Session label. For example, 'SB4320'
+
+        Returns
+        -------
+        str
+            The pack file name.
+
+        """
+        self.refresh(rescan=True)
+        folder = os.path.join(self.root_folder, file, participant, session)
+        pack_file = os.path.join(folder, session + _PACK_EXTENSION)
+
+        to_pack = {
+            dbfid: filename
+            for dbfid, filename in self.find_files(
+                file, participant, session
+            ).items()
+            if filename.lower().endswith(".ktk.zip")
+            and _split_packed_file_name(filename)[1] == ""
+            and os.path.samefile(os.path.dirname(filename), folder)
+        }
+        if len(to_pack) == 0:
+            return pack_file  # Nothing to pack, don't create an empty pack
+
+        _write_pack_members(
+            pack_file,
+            {
+                dbfid: (os.path.basename(filename), filename)
+                for dbfid, filename in to_pack.items()
+            },
+        )
+        # Only delete once everything is safely packed
+        for filename in to_pack.values():
+            os.remove(filename)
+
+        self.refresh(rescan=True)
+        return pack_file
+
+    def unpack_session(
+        self, file: str, participant: str, session: str
+    ) -> None:
+        """
+        Extract the files of a session's pack, then delete the pack.
+
+        This reverses `pack_session`.
+
+        Parameters
+        ----------
+        file
+            File label. For example, 'SyncedMarkers'
+        participant
+            Participant label. For example, 'P01'
+        session
+            Session label. For example, 'SB4320'
+
+        """
+        folder = os.path.join(self.root_folder, file, participant, session)
+        pack_file = os.path.join(folder, session + _PACK_EXTENSION)
+
+        with _file_lock(pack_file):
+            with _open_pack(pack_file) as pack:
+                for member in pack.namelist():
+                    if os.path.exists(os.path.join(folder, member)):
+                        raise ValueError(
+                            f"Cannot unpack {member}: this would overwrite "
+                            "an existing file."
+                        )
+                pack.extractall(folder)
+            os.remove(pack_file)
+
+        self.refresh(rescan=True)
+
     def _rename_file(
         self,
         current_file: str,
@@ -662,6 +2812,7 @@ class DBInterface:
             new_filename = f"{base_left_part}dbfid{dbfid}n{ext}"
 
         os.rename(current_file, new_filename)
+        return new_filename
 
     def assign_file_id(
         self,
@@ -710,6 +2861,7 @@ class DBInterface:
 
         # Get the current_file if not existing
         if current_file == "":
+            self._check_not_headless("current_file")
             li.message(
                 "Please select the file for \n"
                 f"{participant}, {session}, {trial}, {file}",
@@ -731,7 +2883,7 @@ class DBInterface:
         new_filename = self._rename_file(
             current_file, dbfid, include_trial_name, trial
         )
-        self.refresh()
+        self.refresh(rescan=True)
         return new_filename
 
     def tag_files(self, include_trial_name: bool = True) -> None:
@@ -744,6 +2896,8 @@ class DBInterface:
         - ORIGINALNAME_dbfidXXXXn.EXT
         - ORIGINALNAME_dbfidXXXXn_{TRIALNAME}.EXT
 
+        Files stored in session packs are not renamed.
+
         Parameters
         ----------
         include_trial_name
@@ -753,19 +2907,21 @@ class DBInterface:
 
         """
         # Check that the project has no duplicate files.
-        self.refresh()
+        self.refresh(rescan=True)
         if len(self.duplicates) > 0:
             raise ValueError(
                 "Cannot run this method on a project with duplicates."
             )
 
-        for i, row in self.table.iterrows():
-            if row["FileName"] != "":
-                self._rename_file(
-                    row["FileName"], i, include_trial_name, row["Trial"]
-                )
+        for i, row in self._table.iterrows():
+            if i in self._files:
+                filename = self._files.path(i)
+                if _split_packed_file_name(filename)[1] == "":
+                    self._rename_file(
+                        filename, i, include_trial_name, row["Trial"]
+                    )
 
-        self.refresh()
+        self.refresh(rescan=True)
 
     def reassign_file_id_by_folder(
         self, file_label, folder: str = ""
@@ -821,10 +2977,11 @@ class DBInterface:
             - 'NoFileTypeLabel' : list of files which associated trial does not
               contain the specified FileTypeLabel
         """
-        self.refresh()
+        self.refresh(rescan=True)
 
         # Run through the specified folder
         if folder == "":
+            self._check_not_headless("folder")
             li.message(
                 "Select the folder that contains the files "
                 f"that should be reassigned to be {file_label}"
@@ -845,7 +3002,7 @@ class DBInterface:
             old_file_id = int(s_old_file_id)
 
             # Find corresponding entry
-            entry = self.table.loc[old_file_id]
+            entry = self._table.loc[old_file_id]
 
             # Reassign the file to the correct file type
             self.assign_file_id(
@@ -860,6 +3017,35 @@ class DBInterface:
             self.refresh()
 
 
+def read_dataset(path: str) -> Any:
+    """
+    Open a dataset exported by DBInterface.export_dataset.
+
+    The dataset is evaluated lazily: no data is read until it is
+    converted, for example using
+    `read_dataset(path).to_table(filter=..., columns=...).to_pandas()`.
+    Filters on the Participant and Session columns only read the matching
+    partitions. This requires pyarrow.
+
+    Parameters
+    ----------
+    path
+        Folder of the dataset.
+
+    Returns
+    -------
+    pyarrow.dataset.Dataset
+        The dataset, with Participant and Session columns taken from the
+        partitions.
+
+    """
+    partitioning = ds.partitioning(
+        pa.schema([("Participant", pa.string()), ("Session", pa.string())]),
+        flavor="hive",
+    )
+    return ds.dataset(path, format="parquet", partitioning=partitioning)
+
+
 if __name__ == "__main__":
     import doctest
     import kineticstoolkit as ktk